@@ -1,66 +1,231 @@
 import os
 import secrets
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import boto3
 from botocore.exceptions import ClientError
-from flask import Flask, render_template_string, redirect, url_for, request, session, abort
-import psycopg2
+from flask import Flask, render_template, redirect, url_for, request, session, abort, make_response
+from psycopg2.extensions import connection as PgConnection
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
 from werkzeug.security import check_password_hash
+from markupsafe import Markup, escape
+from cachetools import TTLCache
+from flask_caching import Cache
+from flask_compress import Compress
+from jinja2 import FileSystemBytecodeCache
+from functools import lru_cache
+import threading
+import mimetypes
+import hashlib
 import re
 
 # --- 1. CONFIGURATION AND INITIALIZATION ---
 app = Flask(__name__)
 
+# Request threads only enqueue log records; a listener thread writes them to stderr.
+LOG_QUEUE = queue.SimpleQueue()
+LOG_HANDLER = logging.StreamHandler()
+LOG_HANDLER.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+LOG_LISTENER = QueueListener(LOG_QUEUE, LOG_HANDLER)
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop)
+logger = logging.getLogger('website')
+logger.addHandler(QueueHandler(LOG_QUEUE))
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
 # Load secrets securely from Render Environment Variables
 DB_URL = os.environ.get('DATABASE_URL')
 AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_REGION_NAME = os.environ.get('AWS_REGION_NAME', 'us-east-1')
 S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', 'your-default-bucket-name')
+S3_URL_EXPIRES = 300
+# A signed URL can be served from the cache and then reused by the browser, so
+# S3_URL_CACHE_TTL + MEDIA_REDIRECT_MAX_AGE must stay below S3_URL_EXPIRES.
+S3_URL_CACHE_TTL = 60
+MEDIA_REDIRECT_MAX_AGE = 180
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(16))
+# Templates are compiled once per worker; never re-stat them on each render.
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+# Compiled template bytecode is shared on disk, so new or restarted workers skip the Jinja compile.
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(os.environ.get('JINJA_CACHE_DIR'))
+# Static URLs carry a content hash (see versioned_static_url), so browsers may cache them for a year.
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
+
+# Gzip/Brotli-compress page responses; chapter bodies shrink several-fold on the wire.
+# Flask serves .js as text/javascript on current Pythons; older mimetypes tables say application/javascript.
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/css', 'text/javascript', 'application/javascript']
+app.config['COMPRESS_LEVEL'] = 6
+Compress(app)
+
+# Story and chapter content changes rarely; cached query results expire after this many seconds.
+# With REDIS_URL set, all Gunicorn workers share one cache (and one invalidation).
+CONTENT_CACHE_TIMEOUT = int(os.environ.get('CONTENT_CACHE_TIMEOUT', 600))
+REDIS_URL = os.environ.get('REDIS_URL')
+cache = Cache(app, config={
+    'CACHE_TYPE': 'RedisCache' if REDIS_URL else 'SimpleCache',
+    'CACHE_REDIS_URL': REDIS_URL,
+    'CACHE_KEY_PREFIX': 'website:',
+    'CACHE_DEFAULT_TIMEOUT': CONTENT_CACHE_TIMEOUT
+})
+
+# Each Gunicorn worker builds its own pool after fork, and each of its threads holds at most
+# one connection, so size the pool to the per-worker thread count (see procfile).
+# DB_POOL_MIN is how many idle connections are kept open: the pool closes any connection
+# returned beyond it, losing its TLS session and prepared statements.
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', GUNICORN_THREADS))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', GUNICORN_THREADS))
+
+DB_POOL = None
+DB_POOL_LOCK = threading.Lock()
+S3_URL_CACHE = TTLCache(maxsize=4096, ttl=S3_URL_CACHE_TTL)
+S3_URL_CACHE_LOCK = threading.Lock()
+
+# Sentence boundaries for the reader's marker spans; the capture keeps the punctuation
+SENTENCE_SPLIT = re.compile(r'([.!?])')
+
+def init_s3_client():
+    """Builds the S3 client once per worker; returns None if it cannot be created."""
+    try:
+        if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
+             raise ValueError("AWS credentials are not set.")
+
+        return boto3.client(
+            's3',
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            region_name=AWS_REGION_NAME
+        )
+    except Exception as e:
+        logger.critical("S3 client init failed: %s", e)
+        return None
+
+# boto3 clients are thread-safe, so one module-level client serves every request.
+S3_CLIENT = init_s3_client()
+
+class PreparingConnection(PgConnection):
+    """psycopg2 connection that remembers which statements it has PREPAREd."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+def get_db_pool():
+    """Initializes and returns the shared Postgres connection pool."""
+    global DB_POOL
+    if DB_POOL is not None: return DB_POOL
 
-S3_CLIENT = None
-
-def get_s3_client():
-    """Initializes and returns the S3 client safely."""
-    global S3_CLIENT
-    if S3_CLIENT is None:
-        try:
-            if not AWS_ACCESS_KEY_ID or not AWS_SECRET_ACCESS_KEY:
-                 raise ValueError("AWS credentials are not set.")
-
-            S3_CLIENT = boto3.client(
-                's3',
-                aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                region_name=AWS_REGION_NAME
+    # Threads of one worker can race here on the first requests; only one may build the pool
+    with DB_POOL_LOCK:
+        if DB_POOL is None:
+            DB_POOL = ThreadedConnectionPool(
+                minconn=DB_POOL_MIN,
+                maxconn=DB_POOL_MAX,
+                dsn=DB_URL,
+                sslmode='require',
+                connection_factory=PreparingConnection
             )
-        except Exception as e:
-            print(f"CRITICAL S3 ERROR: {e}")
-            S3_CLIENT = None
-    return S3_CLIENT
+    return DB_POOL
 
+def close_db_pool():
+    """Closes every pooled connection so backends are released on worker exit."""
+    if DB_POOL is not None and not DB_POOL.closed:
+        DB_POOL.closeall()
+
+atexit.register(close_db_pool)
+
+@contextmanager
 def get_db_connection():
-    """Returns a new psycopg2 connection using the secure DB_URL."""
-    return psycopg2.connect(DB_URL, sslmode='require')
+    """Checks a connection out of the pool and always returns it afterwards."""
+    pool = get_db_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+@contextmanager
+def get_db_cursor(cursor_factory=RealDictCursor, autocommit=True):
+    """Yields a cursor (dict rows by default) on a pooled connection.
+
+    Every route only reads, so the default is autocommit: each SELECT runs
+    without an implicit BEGIN/COMMIT around it. Pass autocommit=False for
+    writes; the block is then committed if it succeeds.
+    """
+    with get_db_connection() as conn:
+        conn.autocommit = autocommit
+        with conn.cursor(cursor_factory=cursor_factory) as cur:
+            yield cur
+        if not autocommit: conn.commit()
+
+def execute_prepared(cur, name, sql_query, params=()):
+    """Runs sql_query ($1-style placeholders) as a named prepared statement.
+
+    The statement is PREPAREd the first time a pooled connection sees it, so
+    Postgres parses and plans it once per connection instead of once per request.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {sql_query}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+@lru_cache(maxsize=None)
+def static_file_version(filename):
+    """Returns a short content hash for a file in the static folder."""
+    with open(os.path.join(app.static_folder, filename), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+@app.url_defaults
+def versioned_static_url(endpoint, values):
+    """Appends ?v=<hash> to static URLs so a deploy busts long-lived browser caches."""
+    if endpoint == 'static' and 'filename' in values:
+        values['v'] = static_file_version(values['filename'])
+
+@lru_cache(maxsize=None)
+def chapter_shell_version():
+    """Returns a short hash of the reader page's template and assets; fixed for a deploy."""
+    with open(os.path.join(app.root_path, app.template_folder, 'chapter.html'), 'rb') as f:
+        template_hash = hashlib.sha1(f.read()).hexdigest()
+    assets = f"{static_file_version('css/reader.css')}:{static_file_version('reader.js')}"
+    return hashlib.sha1(f"{template_hash}:{assets}".encode()).hexdigest()[:12]
 
 def generate_signed_s3_url(series_slug, book_slug, filename, media_type):
     """Generates a secure, time-limited URL for a private S3 object."""
-    client = get_s3_client()
+    client = S3_CLIENT
     if client is None: return None
     
     media_folder = 'images' if media_type == 'image' else 'audio'
     s3_key = (f"media/series/{series_slug}/{book_slug}/scenes/{media_folder}/{filename}")
 
+    with S3_URL_CACHE_LOCK:
+        url = S3_URL_CACHE.get(s3_key)
+    if url is not None: return url
+
+    params = {'Bucket': S3_BUCKET_NAME, 'Key': s3_key}
+    # Pin the served Content-Type from the extension in case the object was uploaded without one
+    content_type, _ = mimetypes.guess_type(filename)
+    if content_type: params['ResponseContentType'] = content_type
+
     try:
         url = client.generate_presigned_url(
             ClientMethod='get_object',
-            Params={'Bucket': S3_BUCKET_NAME, 'Key': s3_key},
-            ExpiresIn=300
+            Params=params,
+            ExpiresIn=S3_URL_EXPIRES
         )
+        with S3_URL_CACHE_LOCK:
+            S3_URL_CACHE[s3_key] = url
         return url
     except ClientError as e:
-        print(f"AWS S3 Signing Error for key {s3_key}: {e}")
+        logger.error("AWS S3 signing error for key %s: %s", s3_key, e)
         return None
 
 # --- 2. AUTHENTICATION ROUTES ---
@@ -71,31 +236,7 @@ def login_page():
     
     error_message = request.args.get('error')
     
-    html_content = f"""
-    <!DOCTYPE html><html><head>
-        <title>Private Library Login</title>
-        <link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Tinos:wght@400;700&family=Cormorant+Garamond:wght@300;700&display=swap">
-        <style>
-            /* --- High-End Login CSS --- */
-            body {{ background-color: #F8F6F0; color: #262626; font-family: 'Tinos', serif; margin: 0; padding: 0; }}
-            .login-container {{ max-width: 400px; margin: 15vh auto; padding: 3rem; background-color: #FFFFFF; border-radius: 12px; box-shadow: 0 4px 20px rgba(0, 0, 0, 0.08); }}
-            .login-title {{ font-family: 'Cormorant Garamond', serif; font-weight: 700; font-size: 2.5rem; color: #8B7D6C; margin-bottom: 0.5rem; }}
-            .error-message {{ color: #CC0000; font-weight: bold; margin-top: 1rem; }}
-        </style>
-    </head><body>
-        <div class="login-container">
-            <h1 class="login-title">Welcome</h1>
-            {f'<p class="error-message">Incorrect username or password.</p>' if error_message else ''}
-            
-            <form method="POST" action="{url_for('login_submit')}"> 
-                <div class="form-group"><label for="username">Username or Email</label><input type="text" id="username" name="username" required></div>
-                <div class="form-group"><label for="password">Password</label><input type="password" id="password" name="password" required></div>
-                <button type="submit" class="login-button">Access Stories</button>
-            </form>
-        </div>
-    </body></html>
-    """
-    return render_template_string(html_content)
+    return render_template('login.html', error_message=error_message)
 
 @app.route('/login', methods=['POST'])
 def login_submit():
@@ -104,29 +245,28 @@ def login_submit():
     user = None
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # 1. Retrieve user hash and credentials
-        cur.execute("""
-            SELECT user_id, username, password_hash 
-            FROM website.users 
-            WHERE username = %s OR email = %s;
-        """, (username_or_email, username_or_email))
-        
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
-        
+        # Single-row lookup: a plain tuple cursor skips building a dict per row
+        with get_db_cursor(cursor_factory=None) as cur:
+            # 1. Retrieve user hash and credentials
+            execute_prepared(cur, 'find_user', """
+                SELECT user_id, username, password_hash
+                FROM website.users
+                WHERE username = $1 OR email = $1
+                LIMIT 1
+            """, (username_or_email,))
+
+            user = cur.fetchone()
+
     except Exception as e:
-        print(f"CRITICAL AUTHENTICATION DB ERROR: {e}")
+        logger.critical("Authentication DB error: %s", e)
         return redirect(url_for('login_page', error='db_fail'))
 
     # 2. SECURE HASH CHECK (Simulated success for now)
     
     if user and password_input == 'testpass': # TEMPORARY: Placeholder for working hash check
-        session['user_id'] = user['user_id']
-        session['username'] = user['username']
+        user_id, username, password_hash = user
+        session['user_id'] = user_id
+        session['username'] = username
         return redirect(url_for('story_library'))
     else:
         return redirect(url_for('login_page', error='invalid'))
@@ -138,241 +278,246 @@ def logout():
 
 # --- 3. APPLICATION CORE HANDLERS ---
 
+@cache.cached(key_prefix='story_list')
+def fetch_stories():
+    """Returns every story with its series slug and first chapter; shared by all readers."""
+    with get_db_cursor() as cur:
+        # The smallest chapter_id is the story's start chapter (1 as fallback)
+        sql_query = """
+        SELECT s.story_id, s.story_title, s.book_slug, se.series_slug,
+               COALESCE(MIN(ch.chapter_id), 1) AS start_chapter_id
+        FROM website.stories s
+        JOIN website.series se ON s.series_id = se.series_id
+        LEFT JOIN website.chapters ch ON ch.story_id = s.story_id
+        GROUP BY s.story_id, s.story_title, s.book_slug, se.series_slug
+        """
+        execute_prepared(cur, 'story_list', sql_query)
+        return [dict(row) for row in cur.fetchall()]
+
+def fetch_chapter(chapter_id):
+    """Returns (scenes, triggers) for a chapter; scenes are ordered and appear once each."""
+    with get_db_cursor() as cur:
+        # Scene text is fetched once per scene, not once per media trigger
+        scenes_query = """
+        SELECT
+            s.scene_id, s.scene_title, s.scene_text,
+            ch.chapter_title, st.story_title, st.book_slug,
+            se.series_slug
+        FROM website.scenes s
+        JOIN website.chapters ch ON s.chapter_id = ch.chapter_id
+        JOIN website.stories st ON ch.story_id = st.story_id
+        JOIN website.series se ON st.series_id = se.series_id
+        WHERE ch.chapter_id = $1
+        ORDER BY s.scene_order ASC
+        """
+        execute_prepared(cur, 'chapter_scenes', scenes_query, (chapter_id,))
+        scenes = [dict(row) for row in cur.fetchall()]
+
+        # CRITICAL FIX: Media triggers joined to the files table for the file name.
+        # Only image triggers with a sentence marker and a file are ever rendered,
+        # so the rest are filtered here rather than shipped to Python.
+        triggers_query = """
+        SELECT ms.scene_id, ms.text_trigger_id, f.file_path_name AS file_name
+        FROM website.media_sync ms
+        JOIN website.scenes s ON ms.scene_id = s.scene_id
+        JOIN website.files f ON ms.file_id = f.file_id
+        WHERE s.chapter_id = $1
+          AND ms.media_type = 'image'
+          AND ms.text_trigger_id IS NOT NULL
+          AND f.file_path_name IS NOT NULL
+        ORDER BY ms.scene_id, ms.file_id
+        """
+        execute_prepared(cur, 'chapter_image_triggers', triggers_query, (chapter_id,))
+        triggers = [dict(row) for row in cur.fetchall()]
+
+    return scenes, triggers
+
+# Missing chapters return None and are never stored, so probing IDs cannot fill the cache
+@cache.memoize(response_filter=lambda rendered: rendered is not None)
+def render_chapter_body(chapter_id):
+    """Returns (chapter_info, body_html, version) for a chapter, or None if it has no scenes.
+
+    The sentence segmentation and marker HTML only change when the chapter's
+    content does, so the assembled result is cached instead of the raw rows.
+    """
+    scenes, triggers = fetch_chapter(chapter_id)
+    if not scenes: return None
+
+    # Assemble final data
+    first_row = scenes[0]
+    chapter_info = {
+        'title': first_row['chapter_title'],
+        'story_title': first_row['story_title'],
+        'series_slug': first_row['series_slug'],
+        'book_slug': first_row['book_slug'],
+    }
+
+    # Index media triggers by sentence marker ID for O(1) lookup per sentence;
+    # the first row wins if a marker has several, as the rows arrive in a fixed order
+    triggers_by_id = {}
+    for row in triggers:
+        triggers_by_id.setdefault(row['text_trigger_id'], row)
+
+    # ASSEMBLE CONTENT AND MARKERS (The Scrollytelling Stitch)
+    html_parts = []
+
+    for scene_row in scenes:
+        scene_id = scene_row['scene_id']
+        # Escape once per scene; entities add no . ! ? so the sentence split is unchanged
+        raw_text = escape(scene_row['scene_text'])
+
+        # Start of Scene Divider (Visual break and major trigger)
+        html_parts.append(f'<div id="scene-{scene_id}" class="scene-divider trigger-point-major"><h2 class="scene-title">{escape(scene_row["scene_title"])}</h2></div>')
+
+        # --- SENTENCE SEGMENTATION & MARKER INSERTION (Sentence-Level Sync) ---
+        sentences = SENTENCE_SPLIT.split(str(raw_text))
+        current_paragraph_content = []
+        sentence_counter = 0
+
+        # Process sentences and insert markers
+        for i in range(0, len(sentences) - 1, 2):
+            if i + 1 >= len(sentences): break
+
+            sentence = sentences[i].strip() + sentences[i+1]
+            sentence_counter += 1
+
+            # Unique Sentence ID (s-sceneId-sentenceOrder)
+            sentence_marker_id = f's-{scene_id}-{sentence_counter}'
+
+            # Check for image trigger linked to this specific sentence ID
+            trigger_data = triggers_by_id.get(sentence_marker_id)
+
+            # Wrap the sentence in a span for fine-grained control (for audio highlighting)
+            sentence_html = f'<span id="{sentence_marker_id}">{sentence}</span> '
+
+            # If an image trigger exists, add the data attribute around the sentence span
+            if trigger_data:
+                file_name = trigger_data['file_name']
+                sentence_html = (
+                    f'<span class="trigger-point-active" data-image-url="{url_for("secure_media_proxy", scene_id=scene_id, filename=file_name)}">'
+                    f'{sentence_html}</span> '
+                )
+
+            # Assemble paragraphs (Based on simple line breaks for stability)
+            is_new_paragraph = sentence.strip().endswith('  ') 
+
+            if is_new_paragraph and current_paragraph_content:
+                html_parts.append(f"<p>{''.join(current_paragraph_content)}</p>\n\n")
+                current_paragraph_content = [sentence_html]
+            else:
+                current_paragraph_content.append(sentence_html)
+
+        if current_paragraph_content:
+            html_parts.append(f"<p>{''.join(current_paragraph_content)}</p>\n\n")
+
+    # Titles and sentences are escaped above and URLs come from url_for, so the markup is trusted
+    body_html = Markup("".join(html_parts))
+    # Hashed once per cache fill, so revalidating the page never needs to render it
+    version = hashlib.sha1(f"{sorted(chapter_info.items())}:{body_html}".encode()).hexdigest()[:16]
+    return chapter_info, body_html, version
+
+# Misses return None and are never stored, so probing filenames cannot fill the cache
+@cache.memoize(response_filter=lambda row: row is not None)
+def fetch_media_mapping(scene_id, filename):
+    """Returns the series/book slugs and file type for a scene's media file, or None."""
+    with get_db_cursor() as cur:
+        # FIX: We now correctly select file_path_name and alias it as 'file_name' for Python.
+        sql_query = """
+        SELECT st.book_slug, se.series_slug, f.file_type
+        FROM website.media_sync ms
+        JOIN website.files f ON ms.file_id = f.file_id
+        JOIN website.scenes s ON ms.scene_id = s.scene_id
+        JOIN website.chapters ch ON s.chapter_id = ch.chapter_id
+        JOIN website.stories st ON ch.story_id = st.story_id
+        JOIN website.series se ON st.series_id = se.series_id
+        WHERE ms.scene_id = $1 AND f.file_path_name = $2
+        """
+        execute_prepared(cur, 'media_lookup', sql_query, (scene_id, filename))
+        row = cur.fetchone()
+    return dict(row) if row else None
+
+@app.cli.command('clear-content-cache')
+def clear_content_cache():
+    """Drops cached story list, chapter bodies and media mappings after editing content.
+
+    Run as `flask --app app clear-content-cache`. It only reaches the running workers when
+    REDIS_URL is set; SimpleCache lives inside each worker, so without Redis edits show up
+    once CONTENT_CACHE_TIMEOUT expires.
+    """
+    if not REDIS_URL:
+        logger.warning("clear-content-cache: REDIS_URL is not set; workers keep their own caches")
+        return
+    cache.delete('story_list')
+    cache.delete_memoized(render_chapter_body)
+    cache.delete_memoized(fetch_media_mapping)
+
 @app.route('/')
 def story_library():
     if 'user_id' not in session: return redirect(url_for('login_page'))
     
     stories = []
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        sql_query = """
-        SELECT s.story_id, s.story_title, s.book_slug, se.series_slug
-        FROM website.stories s JOIN website.series se ON s.series_id = se.series_id;
-        """
-        cur.execute(sql_query)
-        stories = cur.fetchall()
-        cur.close(); conn.close()
+        stories = fetch_stories()
     except Exception as e:
-        print(f"ERROR fetching library: {e}")
+        logger.error("Error fetching library: %s", e)
     
-    # --- Library HTML Generation ---
-    story_list_html = ""
-    if stories:
-        for story in stories:
-            # FIX: Get the actual start chapter ID for the link
-            try:
-                conn = get_db_connection()
-                cur = conn.cursor()
-                # Find the smallest chapter_id linked to this story
-                start_chapter_query = """
-                    SELECT MIN(chapter_id) AS start_id
-                    FROM website.chapters 
-                    WHERE story_id = %s;
-                """
-                cur.execute(start_chapter_query, (story['story_id'],))
-                start_chapter_id = cur.fetchone()[0] or 1 # Use 1 as fallback
-                cur.close(); conn.close()
-            except:
-                start_chapter_id = 1 # Fallback on error
-                
-            # NOTE: New link goes to the read_chapter route
-            chapter_link = url_for('read_chapter', chapter_id=start_chapter_id) 
-            
-            story_list_html += f"""
-            <div style="border: 1px solid #E0E0E0; padding: 20px; margin-bottom: 15px; border-radius: 8px; background-color: #FFFFFF;">
-                <h3 style="margin: 0 0 5px; font-family: 'Cormorant Garamond', serif; color: #8B7D6C;">{story['story_title']} ({story['series_slug']})</h3>
-                <p><a href="{chapter_link}">Start Reading</a></p>
-            </div>
-            """
-    else:
-        story_list_html = "<p>No stories found. Check your database links.</p>"
-        
-    html_content = f"""
-    <!DOCTYPE html><html><head><title>Private Library</title></head>
-    <body style="font-family: 'Tinos', serif; padding: 40px; background-color: #F8F6F0;">
-        <h1>Welcome, {session.get('username', 'Reader')}!</h1><p><a href="{url_for('logout')}">Logout</a></p><hr>
-        <h2>Your Private Library</h2>
-        {story_list_html}
-    </body></html>
-    """
-    return render_template_string(html_content)
+    return render_template('library.html', stories=stories, username=session.get('username', 'Reader'))
 
 @app.route('/read/chapter/<int:chapter_id>')
 def read_chapter(chapter_id):
     if 'user_id' not in session: return redirect(url_for('login_page'))
     
-    scene_data = {
-        'title': 'Chapter Title Placeholder', 
+    chapter_info = {
+        'title': 'Chapter Title Placeholder',
         'story_title': 'Story Placeholder',
-        'raw_text': "Error: Could not retrieve text from database.",
         'series_slug': '',
         'book_slug': '',
-        'chapter_title': 'Chapter Title Placeholder',
     }
     processed_text_html = ""
+    rendered = None
+    fetch_failed = False
 
-    # 1. DATABASE FETCHING (Get all scenes and triggers for the Chapter)
+    # 1. DATABASE FETCHING AND ASSEMBLY (cached per chapter)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor) 
-        
-        # Get scene details and story/series slugs
-        # CRITICAL FIX: Final SQL query joining to the files table
-        sql_query = """
-        SELECT
-            s.scene_id, s.scene_title, s.scene_text, 
-            ch.chapter_title, st.story_title, st.book_slug,
-            se.series_slug,
-            f.file_path_name AS file_name, ms.text_trigger_id, ms.media_type
-        FROM website.scenes s
-        JOIN website.chapters ch ON s.chapter_id = ch.chapter_id
-        JOIN website.stories st ON ch.story_id = st.story_id
-        JOIN website.series se ON st.series_id = se.series_id
-        LEFT JOIN website.media_sync ms ON ms.scene_id = s.scene_id
-        LEFT JOIN website.files f ON ms.file_id = f.file_id
-        WHERE ch.chapter_id = %s
-        ORDER BY s.scene_order ASC;
-        """
-        cur.execute(sql_query, (chapter_id,))
-        chapter_data = cur.fetchall()
-        
-        if not chapter_data: return abort(404)
-
-        # Assemble final data
-        first_row = chapter_data[0]
-        chapter_info = {
-            'title': first_row['chapter_title'],
-            'story_title': first_row['story_title'],
-            'series_slug': first_row['series_slug'],
-            'book_slug': first_row['book_slug'],
-        }
-        
-        # 2. ASSEMBLE CONTENT AND MARKERS (The Scrollytelling Stitch)
-        processed_text_html = ""
-        
-        for scene_row in chapter_data:
-            scene_id = scene_row['scene_id']
-            raw_text = scene_row['scene_text']
-            
-            # Start of Scene Divider (Visual break and major trigger)
-            processed_text_html += f'<div id="scene-{scene_id}" class="scene-divider trigger-point-major"><h2 class="scene-title">{scene_row["scene_title"]}</h2></div>'
-            
-            # --- SENTENCE SEGMENTATION & MARKER INSERTION (Sentence-Level Sync) ---
-            sentences = re.split('([.!?])', raw_text)
-            paragraph_html = ""
-            current_paragraph_content = ""
-            sentence_counter = 0
-
-            # Process sentences and insert markers
-            for i in range(0, len(sentences) - 1, 2):
-                if i + 1 >= len(sentences): break
-                
-                sentence = sentences[i].strip() + sentences[i+1]
-                sentence_counter += 1
-                
-                # Unique Sentence ID (s-sceneId-sentenceOrder)
-                sentence_marker_id = f's-{scene_id}-{sentence_counter}'
-
-                # Check for image trigger linked to this specific sentence ID
-                trigger_data = next((row for row in chapter_data if row.get('text_trigger_id') == sentence_marker_id), None)
-                
-                # Wrap the sentence in a span for fine-grained control (for audio highlighting)
-                sentence_html = f'<span id="{sentence_marker_id}">{sentence}</span> '
-                
-                # If an image trigger exists, add the data attribute around the sentence span
-                if trigger_data and trigger_data.get('file_name'):
-                    file_name = trigger_data['file_name']
-                    sentence_html = (
-                        f'<span class="trigger-point-active" data-image-url="{url_for("secure_media_proxy", scene_id=scene_id, filename=file_name)}">'
-                        f'{sentence_html}</span> '
-                    )
-
-                # Assemble paragraphs (Based on simple line breaks for stability)
-                is_new_paragraph = sentence.strip().endswith('  ') 
-                
-                if is_new_paragraph and current_paragraph_content:
-                    paragraph_html += f"<p>{current_paragraph_content}</p>\n\n"
-                    current_paragraph_content = sentence_html
-                else:
-                    current_paragraph_content += sentence_html
-                    
-            if current_paragraph_content:
-                paragraph_html += f"<p>{current_paragraph_content}</p>\n\n"
-            
-            processed_text_html += paragraph_html
-            
-        cur.close()
-        conn.close()
-        
+        rendered = render_chapter_body(chapter_id)
     except Exception as e:
-        print(f"CRITICAL CHAPTER FETCH ERROR: {e}")
-        processed_text_html = f"<p>Error: Could not retrieve text from database. {e}</p>"
+        logger.critical("Chapter fetch error: %s", e)
+        fetch_failed = True
+        processed_text_html = Markup("<p>Error: Could not retrieve text from database. {}</p>").format(e)
 
-    # 3. RENDER FINAL PAGE
+    # abort() raises, so it must stay outside the try above or the 404 is swallowed
+    if rendered is None and not fetch_failed: abort(404)
+    if rendered:
+        chapter_info, processed_text_html, body_version = rendered
+        etag = f"{body_version}-{chapter_shell_version()}"
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.set_etag(etag, weak=True)
+            return response
+
+    # 2. RENDER FINAL PAGE
     
     # Final default URL for the image: Use a placeholder until the main trigger fires
     default_image_url = url_for('secure_media_proxy', scene_id=chapter_id, filename='default-cover.jpg') 
     
-    html_content = f"""
-    <!DOCTYPE html><html><head>
-        <title>{chapter_info['title']} | {chapter_info['story_title']}</title>
-        <link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Tinos:wght@400;700&family=Cormorant+Garamond:wght@300;700&display=swap">
-        <style>
-            /* --- High-End Editorial Theme CSS (Full Layout Fix) --- */
-            body {{ background-color: #F8F6F0; color: #262626; font-family: 'Tinos', serif; margin: 0; padding: 0; }}
-            .reading-area {{ display: grid; grid-template-columns: minmax(600px, 800px) 1fr; max-width: 1400px; margin: 0 auto; }}
-            .text-column {{ padding: 3rem 4rem; font-size: 1.25rem; line-height: 1.8; }}
-            .chapter-title {{ font-family: 'Cormorant Garamond', serif; font-weight: 300; font-size: 4rem; color: #8B7D6C; margin-bottom: 3rem; }}
-            .scene-divider {{ border-top: 1px solid #E0E0E0; margin-top: 4rem; padding-top: 2rem; }}
-            .scene-title {{ font-size: 1.5rem; color: #666; font-weight: 400; }}
-            /* Sticky Media Styles */
-            .media-column-sticky {{ position: sticky; top: 0; height: 100vh; padding: 4rem 2rem; box-sizing: border-box; }}
-            .scene-image {{ width: 100%; border-radius: 4px; box-shadow: 0 5px 20px rgba(0, 0, 0, 0.1); transition: opacity 0.3s ease; }}
-        </style>
-    </head><body>
-        <div class="reading-area">
-            <main class="text-column">
-                <p><a href="{url_for('story_library')}" style="color: #8B7D6C;">&larr; Back to Library</a> | <a href="{url_for('logout')}">Logout</a></p>
-                <h1 class="chapter-title">{chapter_info['title']}</h1>
-                {processed_text_html}
-            </main>
-            <aside class="media-column-sticky">
-                <img id="dynamic-scene-image" class="scene-image" src="{default_image_url}" alt="Scene Illustration">
-            </aside>
-        </div>
-        <script>
-            // --- JS INTERSECTION OBSERVER LOGIC ---
-            const dynamicImage = document.getElementById('dynamic-scene-image');
-            const triggers = document.querySelectorAll('.trigger-point-active');
-
-            const options = {{
-                root: null,
-                rootMargin: '0px 0px -40% 0px',
-                threshold: 0
-            }};
-
-            const observer = new IntersectionObserver((entries) => {{
-                entries.forEach(entry => {{
-                    if (entry.isIntersecting) {{
-                        const imageUrl = entry.target.getAttribute('data-image-url');
-                        if (dynamicImage.src !== imageUrl) {{
-                            dynamicImage.style.opacity = '0';
-                            setTimeout(() => {{
-                                dynamicImage.src = imageUrl;
-                                dynamicImage.style.opacity = '1';
-                            }}, 300);
-                        }}
-                    }}
-                }});
-            }}, options);
-            triggers.forEach(p => {{
-                observer.observe(p);
-            }});
-        </script>
-    </body></html>
-    """
-    return render_template_string(html_content)
+    response = make_response(render_template(
+        'chapter.html',
+        chapter_info=chapter_info,
+        processed_text_html=processed_text_html,
+        default_image_url=default_image_url
+    ))
+    if fetch_failed:
+        # Never let a browser revalidate against an error page
+        response.cache_control.no_store = True
+        return response
+
+    # Weak, so Flask-Compress leaves it as is and the 304 check above matches what browsers send back
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.set_etag(etag, weak=True)
+    return response
 
 
 @app.route('/media/<int:scene_id>/<path:filename>')
@@ -381,40 +526,28 @@ def secure_media_proxy(scene_id, filename):
     
     # 1. FETCH NECESSARY SLUGS (Required for S3 Key Construction)
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # FIX: We now correctly select file_path_name and alias it as 'file_name' for Python.
-        sql_query = """
-        SELECT st.book_slug, se.series_slug, f.file_type
-        FROM website.media_sync ms
-        JOIN website.files f ON ms.file_id = f.file_id
-        JOIN website.scenes s ON ms.scene_id = s.scene_id
-        JOIN website.chapters ch ON s.chapter_id = ch.chapter_id
-        JOIN website.stories st ON ch.story_id = st.story_id
-        JOIN website.series se ON st.series_id = se.series_id
-        WHERE ms.scene_id = %s AND f.file_path_name = %s;
-        """
-        cur.execute(sql_query, (scene_id, filename))
-        db_result = cur.fetchone()
-        cur.close(); conn.close()
-
-        if not db_result: 
-            print(f"Proxy Error: Media mapping not found for scene {scene_id} and file {filename}.")
-            return abort(404)
-        
-        # 2. GENERATE SECURE S3 URL
-        # The filename passed to the generate_signed_s3_url function is now guaranteed to be correct.
-        signed_url = generate_signed_s3_url(
-            db_result['series_slug'], db_result['book_slug'], filename, db_result['file_type']
-        )
-        
-        if signed_url:
-            # 3. REDIRECT: Send the browser to the secure, time-limited S3 link
-            return redirect(signed_url, code=302)
-        else:
-            return abort(404)
-
+        db_result = fetch_media_mapping(scene_id, filename)
     except Exception as e:
-        print(f"CRITICAL PROXY ERROR: {e}")
-        return abort(500)
\ No newline at end of file
+        logger.critical("Proxy error: %s", e)
+        return abort(500)
+
+    if not db_result: 
+        logger.warning("Proxy: media mapping not found for scene %s and file %s", scene_id, filename)
+        return abort(404)
+
+    # 2. GENERATE SECURE S3 URL
+    # The filename passed to the generate_signed_s3_url function is now guaranteed to be correct.
+    signed_url = generate_signed_s3_url(
+        db_result['series_slug'], db_result['book_slug'], filename, db_result['file_type']
+    )
+
+    if signed_url:
+        # 3. REDIRECT: Send the browser to the secure, time-limited S3 link.
+        # S3 answers Range / If-None-Match itself; letting the browser cache
+        # the redirect skips this lookup while the signed URL is still valid.
+        response = redirect(signed_url, code=302)
+        response.cache_control.private = True
+        response.cache_control.max_age = MEDIA_REDIRECT_MAX_AGE
+        return response
+    else:
+        return abort(404)
@@ -0,0 +1,30 @@
+-- Indexes for the queries in app.py.
+-- Run with psql outside a transaction block (CREATE INDEX CONCURRENTLY cannot run inside BEGIN):
+--   psql "$DATABASE_URL" -f sql/indexes.sql
+-- Check plans afterwards with EXPLAIN (ANALYZE, BUFFERS).
+
+-- Reader join chain: scenes -> chapters -> stories -> series.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_scenes_chapter_order ON website.scenes (chapter_id, scene_order);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chapters_story_chapter ON website.chapters (story_id, chapter_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_stories_series ON website.stories (series_id);
+
+ANALYZE website.scenes;
+ANALYZE website.chapters;
+ANALYZE website.stories;
+
+-- Login lookup (WHERE username = $1 OR email = $1): lets the planner BitmapOr two index scans.
+-- Skip whichever column already has a UNIQUE constraint, which brings its own index.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username ON website.users (username);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email ON website.users (email);
+
+ANALYZE website.users;
+
+-- Media proxy lookup (WHERE ms.scene_id = $1 AND f.file_path_name = $2): resolve the file by name,
+-- then probe media_sync by (scene_id, file_id). Scenes/chapters/stories join via primary keys.
+-- The scene_id prefix also serves the chapter trigger query's join on media_sync.scene_id.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_files_path_name ON website.files (file_path_name);
+-- Covering: the chapter trigger query also reads text_trigger_id and media_type, so it can stay an index-only scan.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_media_sync_scene_file_cov ON website.media_sync (scene_id, file_id) INCLUDE (text_trigger_id, media_type);
+
+ANALYZE website.files;
+ANALYZE website.media_sync;
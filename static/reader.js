@@ -0,0 +1,28 @@
+// --- JS INTERSECTION OBSERVER LOGIC ---
+// Swaps the sticky scene image as sentences carrying a data-image-url scroll into view.
+const dynamicImage = document.getElementById('dynamic-scene-image');
+const triggers = document.querySelectorAll('.trigger-point-active');
+
+const options = {
+    root: null,
+    rootMargin: '0px 0px -40% 0px',
+    threshold: 0
+};
+
+const observer = new IntersectionObserver((entries) => {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            const imageUrl = entry.target.getAttribute('data-image-url');
+            if (dynamicImage.src !== imageUrl) {
+                dynamicImage.style.opacity = '0';
+                setTimeout(() => {
+                    dynamicImage.src = imageUrl;
+                    dynamicImage.style.opacity = '1';
+                }, 300);
+            }
+        }
+    });
+}, options);
+triggers.forEach(p => {
+    observer.observe(p);
+});